@@ -1,4 +1,3 @@
-import os
 import logging
 from typing import Optional
 
@@ -6,11 +5,9 @@ import jwt
 from fastapi import Depends, HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-logger = logging.getLogger("shopsync")
+from config import SUPABASE_JWT_SECRET, ADMIN_BOOTSTRAP_EMAIL, ADMIN_BOOTSTRAP_SHOP_ID
 
-SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
-ADMIN_BOOTSTRAP_EMAIL = os.getenv("ADMIN_BOOTSTRAP_EMAIL", "")
-ADMIN_BOOTSTRAP_SHOP_ID = os.getenv("ADMIN_BOOTSTRAP_SHOP_ID", "")
+logger = logging.getLogger("shopsync")
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
@@ -47,32 +44,34 @@ async def get_current_user(
     from database import get_supabase_client
     supabase = get_supabase_client()
 
-    resp = supabase.table("users").select("*").eq("user_id", user_id).execute()
+    resp = await supabase.table("users").select("*").eq("user_id", user_id).maybe_single().execute()
 
-    if not resp.data:
+    if not resp:
         # Bootstrap: first user with matching admin email becomes admin automatically
-        all_users = supabase.table("users").select("user_id").limit(1).execute()
+        all_users = await supabase.table("users").select("user_id").limit(1).execute()
         if (
             not all_users.data
             and ADMIN_BOOTSTRAP_EMAIL
             and user_email.lower() == ADMIN_BOOTSTRAP_EMAIL.lower()
         ):
-            logger.info(f"Bootstrap: creating admin account for {user_email}")
-            supabase.table("users").insert({
+            logger.info("Bootstrap: creating admin account for %s", user_email)
+            # The insert returns the new row, so there is no need to read it back.
+            inserted = await supabase.table("users").insert({
                 "user_id": user_id,
                 "email": user_email,
                 "full_name": "Admin",
                 "role": "admin",
                 "shop_id": ADMIN_BOOTSTRAP_SHOP_ID or None,
             }).execute()
-            resp = supabase.table("users").select("*").eq("user_id", user_id).execute()
+            user = inserted.data[0]
         else:
             raise HTTPException(
                 status_code=403,
                 detail="User not found in system. Contact your administrator.",
             )
+    else:
+        user = resp.data
 
-    user = resp.data[0]
     if not user.get("active", True):
         raise HTTPException(status_code=403, detail="Account is deactivated")
 
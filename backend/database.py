@@ -1,23 +1,56 @@
-from supabase import create_client, Client
-from dotenv import load_dotenv
-import os
+from supabase import AsyncClient, AsyncClientOptions
+import httpx
 
-load_dotenv()
+from config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_SERVICE_ROLE_KEY, SUPABASE_POOL_SIZE
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+# One warm HTTP/2 pool shared by PostgREST, storage and auth for both keys.
+# PostgREST already pools Postgres connections on Supabase's side, so this is
+# the only connection setup left on our request path.
+http_client: httpx.AsyncClient
+supabase: AsyncClient
+supabase_admin: AsyncClient | None
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-supabase_admin: Client | None = None
-if SUPABASE_SERVICE_ROLE_KEY:
-    supabase_admin = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+def _create_client(key: str) -> AsyncClient:
+    return AsyncClient(SUPABASE_URL, key, AsyncClientOptions(httpx_client=http_client))
 
 
-def get_supabase_client() -> Client:
+def _build_clients() -> None:
+    global http_client, supabase, supabase_admin
+    http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=SUPABASE_POOL_SIZE,
+            max_keepalive_connections=SUPABASE_POOL_SIZE,
+        ),
+        follow_redirects=True,
+    )
+    supabase = _create_client(SUPABASE_KEY)
+    supabase_admin = _create_client(SUPABASE_SERVICE_ROLE_KEY) if SUPABASE_SERVICE_ROLE_KEY else None
+
+
+_build_clients()
+
+
+def get_supabase_client() -> AsyncClient:
     return supabase
 
 
-def get_admin_client() -> Client | None:
-    return supabase_admin
\ No newline at end of file
+def get_admin_client() -> AsyncClient | None:
+    return supabase_admin
+
+
+def get_http_client() -> httpx.AsyncClient:
+    return http_client
+
+
+def open_clients() -> None:
+    """Worker startup: rebuild the pool and its clients if a previous shutdown closed them."""
+    if http_client.is_closed:
+        _build_clients()
+
+
+async def close_clients() -> None:
+    """Drop the shared pool's connections; called at worker shutdown."""
+    await http_client.aclose()
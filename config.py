@@ -0,0 +1,41 @@
+import os
+
+from dotenv import load_dotenv
+
+# .env is parsed exactly once, before any module reads its settings.
+load_dotenv()
+
+# ── Supabase ──────────────────────────────────────────────────────────────────
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+
+ADMIN_BOOTSTRAP_EMAIL = os.getenv("ADMIN_BOOTSTRAP_EMAIL", "")
+ADMIN_BOOTSTRAP_SHOP_ID = os.getenv("ADMIN_BOOTSTRAP_SHOP_ID", "")
+
+# ── App ───────────────────────────────────────────────────────────────────────
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+PORTAL_URL = os.getenv("PORTAL_URL", "").rstrip("/")
+SHOP_NAME = os.getenv("SHOP_NAME", "Summit Trucks")
+GOOGLE_REVIEW_URL = os.getenv("GOOGLE_REVIEW_URL", "")
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+_raw_origins = os.getenv("ALLOWED_ORIGINS", "")
+ALLOWED_ORIGINS = [o.strip() for o in _raw_origins.split(",") if o.strip()] or ["*"]
+
+# ── Twilio ────────────────────────────────────────────────────────────────────
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_PHONE = os.getenv("TWILIO_PHONE_NUMBER")
+TWILIO_MESSAGING_SERVICE_SID = os.getenv("TWILIO_MESSAGING_SERVICE_SID")
+TWILIO_TIMEOUT = float(os.getenv("TWILIO_TIMEOUT", "10"))
+# SMS_MAX_PER_SECOND is the budget for the whole server; each worker paces
+# its own sends, so it gets an equal share.
+_sms_rate = float(os.getenv("SMS_MAX_PER_SECOND", "10"))
+if _sms_rate <= 0:
+    raise ValueError("SMS_MAX_PER_SECOND must be greater than 0")
+SMS_MAX_PER_SECOND = _sms_rate / max(WEB_CONCURRENCY, 1)
@@ -33,12 +33,17 @@ const CustomerPortal = () => {
 
   // ── Data fetching ────────────────────────────────────────────────────────
 
+  // Vehicle + messages + media + approvals in a single request
   const fetchVehicleData = async () => {
     try {
-      const resp = await axios.get(`${API_BASE}/vehicles/${uniqueLink}`);
-      setVehicle(resp.data);
+      const resp = await axios.get(`${API_BASE}/vehicles/${uniqueLink}/bundle`);
+      const { messages: msgs, media: mediaItems, approvals: apprs, ...vehicleData } = resp.data;
+      setVehicle(vehicleData);
+      setMessages(msgs || []);
+      setMedia(mediaItems || []);
+      setApprovals(apprs || []);
       setLoading(false);
-      return resp.data;
+      return vehicleData;
     } catch {
       setError('Vehicle not found');
       setLoading(false);
@@ -64,15 +69,6 @@ const CustomerPortal = () => {
     }
   };
 
-  const fetchMedia = async (vehicleId) => {
-    try {
-      const resp = await axios.get(`${API_BASE}/vehicles/${vehicleId}/media`);
-      setMedia(resp.data);
-    } catch (err) {
-      console.error('Failed to fetch media:', err);
-    }
-  };
-
   const fetchApprovals = async (vehicleId) => {
     try {
       const resp = await axios.get(`${API_BASE}/vehicles/${vehicleId}/approvals`);
@@ -90,16 +86,7 @@ const CustomerPortal = () => {
 
   useEffect(() => {
     if (!vehicle?.vehicle_id) return;
-    const id = vehicle.vehicle_id;
-    fetchMessages(id);
-    fetchMedia(id);
-    fetchApprovals(id);
-    const interval = setInterval(() => {
-      fetchMessages(id);
-      fetchMedia(id);
-      fetchApprovals(id);
-      fetchVehicleData();
-    }, 30000);
+    const interval = setInterval(fetchVehicleData, 30000);
     return () => clearInterval(interval);
   }, [vehicle?.vehicle_id]);
 
@@ -1,19 +1,33 @@
+import asyncio
+import hashlib
 import logging
+import logging.handlers
 import os
+import queue
+import re
+import time
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime, date as date_type, timedelta
+from functools import lru_cache
 from typing import Optional
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-import requests
-from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, HTTPException, Security, UploadFile, File
+import httpx
+import orjson
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, Request, Response, Security, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from twilio.rest import Client
 
+from config import (
+    SUPABASE_URL, SUPABASE_KEY, ANTHROPIC_API_KEY, PORTAL_URL, SHOP_NAME, GOOGLE_REVIEW_URL, ALLOWED_ORIGINS,
+    PORT, WEB_CONCURRENCY, LOG_LEVEL,
+    TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE, TWILIO_MESSAGING_SERVICE_SID,
+    TWILIO_TIMEOUT, SMS_MAX_PER_SECOND,
+)
 from auth import get_current_user, require_admin, bearer_scheme
-from database import get_supabase_client, get_admin_client
+from database import get_supabase_client, get_admin_client, get_http_client, open_clients, close_clients
 from schemas import (
     VehicleCreate, VehicleResponse, StatusUpdate, MessageCreate,
     ApprovalCreate, ApprovalResponse, ShopCreate, UserInvite, UserUpdate,
@@ -22,35 +36,93 @@ from schemas import (
     ALLOWED_MIME_TYPES, MAX_UPLOAD_BYTES,
 )
 
-load_dotenv()
-
 # ── Anthropic (optional) ─────────────────────────────────────────────────────
 try:
     import anthropic as _anthropic
-    _anthropic_key = os.getenv("ANTHROPIC_API_KEY", "")
-    anthropic_client = _anthropic.Anthropic(api_key=_anthropic_key) if _anthropic_key else None
+    anthropic_client = _anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
 except ImportError:
     anthropic_client = None
 
 # ── Logging ──────────────────────────────────────────────────────────────────
-logging.basicConfig(
-    level=logging.INFO,
-    format='{"time":"%(asctime)s","level":"%(levelname)s","logger":"%(name)s","message":"%(message)s"}',
+# Request handlers only enqueue records; a listener thread (started and stopped
+# with the app lifespan) formats and writes them, so a slow stdout pipe never
+# stalls the event loop. Records logged before startup wait in the queue.
+# force=True because `python main.py` imports this module twice (as __main__
+# and as main); the root logger must feed the queue of the copy whose lifespan
+# actually runs.
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter(
+    '{"time":"%(asctime)s","level":"%(levelname)s","logger":"%(name)s","message":"%(message)s"}',
     datefmt="%Y-%m-%dT%H:%M:%S",
-)
+))
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler], force=True)
+# LOG_LEVEL applies to our own logger only; DEBUG on the root would also
+# turn on httpx/httpcore/hpack frame logging.
 logger = logging.getLogger("shopsync")
+logger.setLevel(LOG_LEVEL)
 
 # ── Config ────────────────────────────────────────────────────────────────────
-PORTAL_URL = os.getenv("PORTAL_URL", "").rstrip("/")
-SHOP_NAME = os.getenv("SHOP_NAME", "Summit Trucks")
-GOOGLE_REVIEW_URL = os.getenv("GOOGLE_REVIEW_URL", "")
-UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
-
-_raw_origins = os.getenv("ALLOWED_ORIGINS", "")
-ALLOWED_ORIGINS = [o.strip() for o in _raw_origins.split(",") if o.strip()] or ["*"]
+PORTAL_TRACK_URL = f"{PORTAL_URL}/track/"
 
 # ── App ───────────────────────────────────────────────────────────────────────
-app = FastAPI(title="ShopSync API", version="2.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the first pooled connection (DNS + TLS + HTTP/2) before traffic
+    # arrives, and release the pool cleanly when the worker stops.
+    global supabase, twilio_client
+    _log_listener.start()
+    open_clients()
+    supabase = get_supabase_client()
+    if twilio_client is not None and twilio_client.is_closed:
+        twilio_client = _build_twilio_client()
+    try:
+        await supabase.table("vehicles").select("vehicle_id").limit(1).execute()
+    except Exception as e:
+        logger.warning("Supabase warm-up failed: %s", e)
+    yield
+    if twilio_client:
+        await twilio_client.aclose()
+    await close_clients()
+    _log_listener.stop()
+
+
+app = FastAPI(
+    title="ShopSync API",
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+
+# Multipart framing around the file itself (boundaries, part headers, caption).
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+
+class RejectOversizedUploads:
+    """Refuse media uploads on Content-Length before the multipart body is received and spooled.
+
+    Plain ASGI so every other request passes straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"].endswith("/media"):
+            length = dict(scope["headers"]).get(b"content-length", b"")
+            if length.isdigit() and int(length) > MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES:
+                response = ORJSONResponse(status_code=413, content={"detail": "File exceeds the 50 MB upload limit."})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+# Registered before CORS so CORS stays outermost and the 413 keeps its headers.
+app.add_middleware(RejectOversizedUploads)
+
 
 app.add_middleware(
     CORSMiddleware,
@@ -63,57 +135,211 @@ app.add_middleware(
 # ── Clients ───────────────────────────────────────────────────────────────────
 supabase = get_supabase_client()
 
-TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
-TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-TWILIO_PHONE = os.getenv("TWILIO_PHONE_NUMBER")
-TWILIO_MESSAGING_SERVICE_SID = os.getenv("TWILIO_MESSAGING_SERVICE_SID")
+def _build_twilio_client() -> httpx.AsyncClient:
+    # Twilio's REST API called directly on the event loop; one keep-alive pool
+    # for every send, so TLS to api.twilio.com is reused and bursts share an
+    # HTTP/2 connection.
+    return httpx.AsyncClient(
+        http2=True,
+        base_url=f"https://api.twilio.com/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}",
+        auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+        timeout=TWILIO_TIMEOUT,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=60),
+    )
+
 
 if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
-    twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    twilio_client = _build_twilio_client()
 else:
     twilio_client = None
     logger.warning("Twilio credentials not configured — SMS disabled")
 
 
+# Sender is fixed for the process; prefer the messaging service when configured.
+_TWILIO_SENDER = (
+    {"MessagingServiceSid": TWILIO_MESSAGING_SERVICE_SID}
+    if TWILIO_MESSAGING_SERVICE_SID
+    else {"From": TWILIO_PHONE}
+)
+
+
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
-def send_sms(to_phone: str, message: str) -> bool:
+# Per-worker share of the SMS cap (see config) so bursts (e.g. a batch of
+# "ready" updates) are spread out instead of tripping Twilio/carrier throttling.
+# Slots are claimed without awaiting, so the event loop makes this race-free.
+_sms_next_slot = 0.0
+
+
+async def _wait_for_sms_slot() -> None:
+    global _sms_next_slot
+    now = time.monotonic()
+    delay = _sms_next_slot - now
+    _sms_next_slot = max(now, _sms_next_slot) + 1 / SMS_MAX_PER_SECOND
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+_E164 = re.compile(r"^\+[1-9]\d{7,14}$")
+_PHONE_STRIP = re.compile(r"[\s().-]")
+
+
+def _to_e164(phone: str) -> str | None:
+    """Normalize stored numbers like "(303) 555-1234" to E.164; None if unusable."""
+    digits = _PHONE_STRIP.sub("", phone or "")
+    if not digits.startswith("+"):
+        if len(digits) == 10:
+            digits = f"+1{digits}"
+        elif len(digits) == 11 and digits.startswith("1"):
+            digits = f"+{digits}"
+    return digits if _E164.match(digits) else None
+
+
+async def send_sms(to_phone: str, message: str) -> bool:
+    """Endpoints queue this with BackgroundTasks so it runs after the response."""
     if not twilio_client:
         return False
+    to_e164 = _to_e164(to_phone)
+    if not to_e164:
+        logger.warning("SMS skipped, invalid phone number to=%s", to_phone)
+        return False
+    await _wait_for_sms_slot()
     try:
-        kwargs = {"body": message, "to": to_phone}
-        if TWILIO_MESSAGING_SERVICE_SID:
-            kwargs["messaging_service_sid"] = TWILIO_MESSAGING_SERVICE_SID
-        else:
-            kwargs["from_"] = TWILIO_PHONE
-        msg = twilio_client.messages.create(**kwargs)
-        logger.info(f"SMS sent sid={msg.sid} to={to_phone}")
+        resp = await twilio_client.post(
+            "/Messages.json",
+            data={"Body": message, "To": to_e164, **_TWILIO_SENDER},
+        )
+        resp.raise_for_status()
+        logger.info("SMS sent sid=%s to=%s", resp.json().get("sid"), to_phone)
         return True
     except Exception as e:
-        logger.error(f"SMS failed to={to_phone} error={e}")
+        logger.error("SMS failed to=%s error=%s", to_phone, e)
         return False
 
 
-def _shop_sms_name(shop_id: str) -> str:
+# Shop rows are read on every SMS and booking page but almost never change;
+# keep them briefly.
+SHOP_CACHE_TTL = 600  # seconds
+_shop_cache: dict[str, tuple[float, dict]] = {}
+
+
+async def _get_shop_cached(shop_id: str) -> dict | None:
+    hit = _shop_cache.get(shop_id)
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
+    resp = await supabase.table("shops").select("*").eq("shop_id", shop_id).maybe_single().execute()
+    if not resp:
+        return None
+    _shop_cache[shop_id] = (time.monotonic() + SHOP_CACHE_TTL, resp.data)
+    return resp.data
+
+
+async def _shop_sms_name(shop_id: str) -> str:
     try:
-        resp = supabase.table("shops").select("name").eq("shop_id", shop_id).execute()
-        if resp.data:
-            return resp.data[0]["name"]
+        shop = await _get_shop_cached(shop_id)
+        if shop:
+            return shop["name"]
     except Exception:
         pass
     return SHOP_NAME
 
 
-def _verify_vehicle_access(vehicle_id: str, user: dict) -> dict:
-    resp = supabase.table("vehicles").select("*").eq("vehicle_id", vehicle_id).execute()
-    if not resp.data:
+# Customer notifications run as background tasks: the lookups they need happen
+# after the response is sent, and failures are logged, never raised.
+async def _sms_customer(vehicle: dict, template: str, **fields) -> None:
+    if not vehicle.get("customer_phone"):
+        return
+    try:
+        customer_name = vehicle.get("customer_name") or "there"
+        body = template.format(
+            customer_name=customer_name,
+            first_name=(customer_name.split() or ["there"])[0],
+            shop_name=await _shop_sms_name(vehicle.get("shop_id", "")),
+            portal_link=f"{PORTAL_TRACK_URL}{vehicle['unique_link']}",
+            **fields,
+        )
+        await send_sms(vehicle["customer_phone"], body)
+    except Exception as e:
+        logger.warning("Customer SMS failed (non-critical) vehicle=%s: %s", vehicle.get("vehicle_id"), e)
+
+
+async def _sms_vehicle_customer(vehicle_id: str, template: str, **fields) -> None:
+    try:
+        resp = await (
+            supabase.table("vehicles")
+            .select("vehicle_id,customer_phone,customer_name,shop_id,unique_link")
+            .eq("vehicle_id", vehicle_id)
+            .maybe_single()
+            .execute()
+        )
+        if resp:
+            await _sms_customer(resp.data, template, **fields)
+    except Exception as e:
+        logger.warning("Customer SMS failed (non-critical) vehicle=%s: %s", vehicle_id, e)
+
+
+def _check_vehicle_access(vehicle: dict | None, user: dict) -> dict:
+    if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
-    vehicle = resp.data[0]
     if user["role"] != "admin" and vehicle.get("shop_id") != user.get("shop_id"):
         raise HTTPException(status_code=403, detail="Access denied to this vehicle")
     return vehicle
 
 
+async def _verify_vehicle_access(vehicle_id: str, user: dict) -> dict:
+    resp = await supabase.table("vehicles").select("vehicle_id,shop_id").eq("vehicle_id", vehicle_id).maybe_single().execute()
+    return _check_vehicle_access(resp.data if resp else None, user)
+
+
+def _vehicle_rpc_access(user: dict) -> dict:
+    """Access params for the vehicle RPCs, which only write when these allow it."""
+    return {"p_shop_id": user.get("shop_id"), "p_is_admin": user["role"] == "admin"}
+
+
+MEDIA_BUCKET = "vehicle-photos"
+# Public bucket: object URLs are a fixed prefix plus the object path.
+MEDIA_PUBLIC_URL = f"{SUPABASE_URL}/storage/v1/object/public/{MEDIA_BUCKET}/"
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+async def _iter_upload(file: UploadFile):
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        yield chunk
+
+
+async def _upload_media_object(path: str, file: UploadFile) -> None:
+    """Stream an upload to Storage in chunks instead of buffering it in memory."""
+    headers = {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Content-Type": file.content_type or "application/octet-stream",
+        "cache-control": "max-age=3600",
+        "x-upsert": "false",
+    }
+    if file.size is not None:
+        headers["Content-Length"] = str(file.size)
+    resp = await get_http_client().post(
+        f"{SUPABASE_URL}/storage/v1/object/{MEDIA_BUCKET}/{path}",
+        content=_iter_upload(file),
+        headers=headers,
+    )
+    resp.raise_for_status()
+
+
+# Dashboards poll these reads; let the browser revalidate instead of refetching.
+POLLED_CACHE_CONTROL = "private, max-age=5"
+
+
+def _with_etag(request: Request, response: Response, data):
+    """Return 304 when the client's ETag still matches, else tag and return data."""
+    digest = hashlib.md5(orjson.dumps(data, option=orjson.OPT_SORT_KEYS), usedforsecurity=False)
+    headers = {"ETag": f'"{digest.hexdigest()}"', "Cache-Control": POLLED_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return data
+
+
 def _get_tz(tz_str: str) -> ZoneInfo:
     try:
         return ZoneInfo(tz_str)
@@ -173,10 +399,10 @@ def _generate_slots(
 async def health_check():
     db_ok = False
     try:
-        supabase.table("vehicles").select("vehicle_id").limit(1).execute()
+        await supabase.table("vehicles").select("vehicle_id").limit(1).execute()
         db_ok = True
     except Exception as e:
-        logger.error(f"Health DB error: {e}")
+        logger.error("Health DB error: %s", e)
 
     return {
         "status": "ok" if db_ok else "degraded",
@@ -204,9 +430,9 @@ async def get_me(user: dict = Depends(get_current_user)):
 @app.get("/shop/{shop_id}")
 async def get_shop(shop_id: str):
     try:
-        resp = supabase.table("shops").select("*").eq("shop_id", shop_id).execute()
-        if resp.data:
-            return resp.data[0]
+        shop = await _get_shop_cached(shop_id)
+        if shop:
+            return shop
     except Exception:
         pass
     return {"shop_id": shop_id, "name": SHOP_NAME, "google_review_url": GOOGLE_REVIEW_URL}
@@ -215,16 +441,21 @@ async def get_shop(shop_id: str):
 # ── Shop endpoints (auth required) ────────────────────────────────────────────
 
 @app.get("/shop/{shop_id}/vehicles")
-async def get_shop_vehicles(shop_id: str, user: dict = Depends(get_current_user)):
+async def get_shop_vehicles(
+    shop_id: str,
+    request: Request,
+    response: Response,
+    user: dict = Depends(get_current_user),
+):
     if user["role"] != "admin" and user.get("shop_id") != shop_id:
         raise HTTPException(status_code=403, detail="Access denied to this shop's data")
     try:
-        resp = supabase.table("vehicles").select("*").eq("shop_id", shop_id).execute()
-        return resp.data
+        resp = await supabase.table("vehicles").select("*").eq("shop_id", shop_id).execute()
+        return _with_etag(request, response, resp.data)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"get_shop_vehicles error: {e}")
+        logger.error("get_shop_vehicles error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -233,7 +464,7 @@ async def get_dashboard_summary(shop_id: str, user: dict = Depends(get_current_u
     if user["role"] != "admin" and user.get("shop_id") != shop_id:
         raise HTTPException(status_code=403, detail="Access denied to this shop's data")
     try:
-        vehicles_resp = (
+        vehicles_resp = await (
             supabase.table("vehicles")
             .select("*")
             .eq("shop_id", shop_id)
@@ -247,21 +478,25 @@ async def get_dashboard_summary(shop_id: str, user: dict = Depends(get_current_u
 
         vehicle_ids = [v["vehicle_id"] for v in vehicles]
 
-        messages_resp = supabase.table("messages").select("vehicle_id,sender_type").in_("vehicle_id", vehicle_ids).execute()
-        approvals_resp = supabase.table("approvals").select("*").in_("vehicle_id", vehicle_ids).execute()
-        photos_resp = (
+        # The three lookups only depend on vehicle_ids, so run them side by side.
+        messages_resp, approvals_resp, photos_resp = await asyncio.gather(
+            supabase.table("messages")
+            .select("vehicle_id")
+            .in_("vehicle_id", vehicle_ids)
+            .eq("sender_type", "customer")
+            .execute(),
+            supabase.table("approvals").select("*").in_("vehicle_id", vehicle_ids).execute(),
             supabase.table("media")
-            .select("vehicle_id,media_url,caption")
+            .select("vehicle_id,media_url")
             .in_("vehicle_id", vehicle_ids)
             .eq("caption", "vehicle_photo")
-            .execute()
+            .execute(),
         )
 
         message_counts: dict = {}
         for msg in messages_resp.data:
-            if msg["sender_type"] == "customer":
-                vid = msg["vehicle_id"]
-                message_counts[vid] = message_counts.get(vid, 0) + 1
+            vid = msg["vehicle_id"]
+            message_counts[vid] = message_counts.get(vid, 0) + 1
 
         approvals_by_vehicle: dict = {}
         for approval in approvals_resp.data:
@@ -279,7 +514,7 @@ async def get_dashboard_summary(shop_id: str, user: dict = Depends(get_current_u
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"get_dashboard_summary error: {e}")
+        logger.error("get_dashboard_summary error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -288,7 +523,7 @@ async def get_dashboard_summary(shop_id: str, user: dict = Depends(get_current_u
 @app.post("/admin/shops")
 async def admin_create_shop(shop: ShopCreate, admin: dict = Depends(require_admin)):
     try:
-        resp = supabase.table("shops").insert({
+        resp = await supabase.table("shops").insert({
             "name": shop.name,
             "phone": shop.phone,
             "address": shop.address,
@@ -299,19 +534,19 @@ async def admin_create_shop(shop: ShopCreate, admin: dict = Depends(require_admi
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"admin_create_shop error: {e}")
+        logger.error("admin_create_shop error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/admin/shops")
 async def admin_list_shops(admin: dict = Depends(require_admin)):
     try:
-        resp = supabase.table("shops").select("*").order("created_at").execute()
+        resp = await supabase.table("shops").select("*").order("created_at").execute()
         return resp.data
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"admin_list_shops error: {e}")
+        logger.error("admin_list_shops error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -324,13 +559,13 @@ async def admin_invite_user(invite: UserInvite, admin: dict = Depends(require_ad
             detail="User invite requires SUPABASE_SERVICE_ROLE_KEY to be configured.",
         )
     try:
-        res = supabase_admin.auth.admin.invite_user_by_email(
+        res = await supabase_admin.auth.admin.invite_user_by_email(
             invite.email,
             options={"redirect_to": f"{PORTAL_URL}/accept-invite"},
         )
         user_id = str(res.user.id)
 
-        supabase.table("users").insert({
+        await supabase.table("users").insert({
             "user_id": user_id,
             "email": invite.email,
             "full_name": invite.full_name,
@@ -338,24 +573,24 @@ async def admin_invite_user(invite: UserInvite, admin: dict = Depends(require_ad
             "shop_id": invite.shop_id or None,
         }).execute()
 
-        logger.info(f"Invited user {invite.email} as {invite.role}")
+        logger.info("Invited user %s as %s", invite.email, invite.role)
         return {"success": True, "user_id": user_id, "email": invite.email}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"admin_invite_user error: {e}")
+        logger.error("admin_invite_user error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/admin/users")
 async def admin_list_users(admin: dict = Depends(require_admin)):
     try:
-        resp = supabase.table("users").select("*").order("created_at").execute()
+        resp = await supabase.table("users").select("*").order("created_at").execute()
         return resp.data
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"admin_list_users error: {e}")
+        logger.error("admin_list_users error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -365,14 +600,14 @@ async def admin_update_user(user_id: str, update: UserUpdate, admin: dict = Depe
         patch = {k: v for k, v in update.model_dump(exclude_unset=True).items()}
         if not patch:
             raise HTTPException(status_code=400, detail="No fields to update")
-        resp = supabase.table("users").update(patch).eq("user_id", user_id).execute()
+        resp = await supabase.table("users").update(patch).eq("user_id", user_id).execute()
         if not resp.data:
             raise HTTPException(status_code=404, detail="User not found")
         return resp.data[0]
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"admin_update_user error: {e}")
+        logger.error("admin_update_user error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -382,32 +617,43 @@ async def admin_delete_user(user_id: str, admin: dict = Depends(require_admin)):
     if user_id == admin["user_id"]:
         raise HTTPException(status_code=400, detail="You cannot delete your own account")
     try:
-        user_resp = supabase.table("users").select("active,email").eq("user_id", user_id).execute()
-        if not user_resp.data:
-            raise HTTPException(status_code=404, detail="User not found")
-        if user_resp.data[0].get("active"):
+        # Conditional delete in one round-trip; only look the user up to explain a miss.
+        deleted = await (
+            supabase.table("users")
+            .delete()
+            .eq("user_id", user_id)
+            .not_.is_("active", "true")
+            .execute()
+        )
+        if not deleted.data:
+            user_resp = await supabase.table("users").select("active").eq("user_id", user_id).execute()
+            if not user_resp.data:
+                raise HTTPException(status_code=404, detail="User not found")
             raise HTTPException(status_code=400, detail="Deactivate the user before deleting")
-        supabase.table("users").delete().eq("user_id", user_id).execute()
-        logger.info(f"Admin {admin['email']} deleted user {user_resp.data[0].get('email')}")
+        logger.info("Admin %s deleted user %s", admin['email'], deleted.data[0].get('email'))
         return {"success": True}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"admin_delete_user error: {e}")
+        logger.error("admin_delete_user error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ── Vehicle endpoints ──────────────────────────────────────────────────────────
 
 @app.post("/vehicles/", response_model=VehicleResponse)
-async def create_vehicle(vehicle: VehicleCreate, user: dict = Depends(get_current_user)):
+async def create_vehicle(
+    vehicle: VehicleCreate,
+    background_tasks: BackgroundTasks,
+    user: dict = Depends(get_current_user),
+):
     shop_id = user.get("shop_id")
     if not shop_id:
         raise HTTPException(status_code=400, detail="Your account is not assigned to a shop.")
     try:
-        unique_link = str(uuid.uuid4())
+        unique_link = uuid.uuid4().hex
 
-        resp = supabase.table("vehicles").insert({
+        resp = await supabase.table("vehicles").insert({
             "shop_id": shop_id,
             "customer_name": vehicle.customer_name,
             "customer_phone": vehicle.customer_phone,
@@ -428,134 +674,177 @@ async def create_vehicle(vehicle: VehicleCreate, user: dict = Depends(get_curren
         vehicle_data = resp.data[0]
 
         if PORTAL_URL:
-            tracking_url = f"{PORTAL_URL}/track/{unique_link}"
-            shop_name = _shop_sms_name(shop_id)
-            send_sms(
-                vehicle.customer_phone,
-                f"Hi {vehicle.customer_name}! Your vehicle is checked in at {shop_name}. "
-                f"Track its status here: {tracking_url}",
+            background_tasks.add_task(
+                _sms_customer,
+                vehicle_data,
+                "Hi {customer_name}! Your vehicle is checked in at {shop_name}. "
+                "Track its status here: {portal_link}",
             )
 
-        return VehicleResponse(**vehicle_data)
+        # response_model validates and trims the row once; no need to build the model here too.
+        return vehicle_data
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"create_vehicle error: {e}")
+        logger.error("create_vehicle error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/vehicles/{unique_link}")
 async def get_vehicle_by_link(unique_link: str):
     try:
-        resp = supabase.table("vehicles").select("*").eq("unique_link", unique_link).execute()
-        if not resp.data:
+        resp = await supabase.table("vehicles").select("*").eq("unique_link", unique_link).maybe_single().execute()
+        if not resp:
             raise HTTPException(status_code=404, detail="Vehicle not found")
-        return resp.data[0]
+        return resp.data
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("get_vehicle_by_link error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/vehicles/{unique_link}/bundle")
+async def get_vehicle_bundle(unique_link: str):
+    """Public: vehicle plus its messages, media and approvals in one query."""
+    try:
+        resp = await (
+            supabase.table("vehicles")
+            .select("*,messages(*),media(*),approvals(*)")
+            .eq("unique_link", unique_link)
+            .order("sent_at", foreign_table="messages")
+            .order("uploaded_at", desc=True, foreign_table="media")
+            .maybe_single()
+            .execute()
+        )
+        if not resp:
+            raise HTTPException(status_code=404, detail="Vehicle not found")
+        return resp.data
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"get_vehicle_by_link error: {e}")
+        logger.error("get_vehicle_bundle error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+_STATUS_SMS_TEMPLATES = {
+    "checked_in": "Hi {first_name}! Your vehicle has been checked in at {shop_name}.",
+    "inspection": "Update: Your vehicle is now being inspected.",
+    "waiting_parts": "Update: Your vehicle is awaiting parts. We'll notify you when work resumes.",
+    "in_progress": "Update: Your vehicle service is now in progress.",
+    "awaiting_warranty": "Update: Your vehicle is awaiting warranty approval. We'll keep you posted.",
+    "quality_check": "Update: Your vehicle is undergoing a final quality check.",
+}
+_DEFAULT_STATUS_SMS = "Update on your vehicle: {status_title}"
+
+
+@lru_cache(maxsize=None)
+def _status_title(status: str) -> str:
+    return status.replace("_", " ").title()
+
+
+async def _sms_status_update(vehicle: dict, new_status: str, note: str | None) -> None:
+    try:
+        customer_name = vehicle.get("customer_name") or "there"
+        shop_id = vehicle.get("shop_id", "")
+        shop_name = await _shop_sms_name(shop_id)
+        first_name = (customer_name.split() or ["there"])[0]
+        v_year = vehicle.get("year", "")
+        v_make = vehicle.get("make", "")
+        v_model = vehicle.get("model", "")
+        vehicle_str = " ".join(str(p) for p in [v_year, v_make, v_model] if p)
+
+        if new_status == "ready":
+            try:
+                shop = await _get_shop_cached(shop_id)
+            except Exception as e:
+                logger.warning("Review URL lookup failed (non-critical): %s", e)
+                shop = None
+            review_url = (shop.get("google_review_url") or "") if shop else ""
+            parts = [f"Great news {first_name}! Your vehicle is ready for pickup at {shop_name}."]
+            if vehicle_str:
+                parts.append(f"Thank you for trusting us with your {vehicle_str}.")
+            if review_url:
+                parts.append(f"If you have a moment, please leave us a review: {review_url}")
+            sms_body = " ".join(parts)
+        else:
+            template = _STATUS_SMS_TEMPLATES.get(new_status, _DEFAULT_STATUS_SMS)
+            sms_body = template.format(
+                first_name=first_name,
+                shop_name=shop_name,
+                status_title=_status_title(new_status),
+            )
+        if note:
+            sms_body = f"{sms_body}\n{note}"
+        await send_sms(vehicle["customer_phone"], sms_body)
+    except Exception as e:
+        logger.warning("Status SMS failed (non-critical) vehicle=%s: %s", vehicle.get("vehicle_id"), e)
+
+
 @app.patch("/vehicles/{vehicle_id}/status")
 async def update_vehicle_status(
     vehicle_id: str,
     status_update: StatusUpdate,
+    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_user),
 ):
     try:
-        current_vehicle = _verify_vehicle_access(vehicle_id, user)
-        old_status = current_vehicle["status"]
-
-        supabase.table("vehicles").update({"status": status_update.new_status}).eq("vehicle_id", vehicle_id).execute()
-
-        try:
-            supabase.table("updates").insert({
-                "vehicle_id": vehicle_id,
-                "user_id": user["user_id"],
-                "old_status": old_status,
-                "new_status": status_update.new_status,
-                "message": status_update.message,
-            }).execute()
-        except Exception as err:
-            logger.warning(f"Non-critical: failed to insert status update record: {err}")
+        # Update + history insert in one round-trip; returns the prior row.
+        resp = await supabase.rpc("update_status_with_log", {
+            "p_vehicle_id": vehicle_id,
+            "p_new_status": status_update.new_status,
+            "p_user_id": user["user_id"],
+            "p_message": status_update.message,
+            **_vehicle_rpc_access(user),
+        }).execute()
+        current_vehicle = _check_vehicle_access(resp.data, user)
 
         if status_update.new_status == "completed":
             return {"success": True, "message": "Vehicle archived"}
 
-        customer_phone = current_vehicle.get("customer_phone")
-        customer_name = current_vehicle.get("customer_name", "Customer")
-        shop_id = current_vehicle.get("shop_id", "")
-
-        if customer_phone:
-            shop_name = _shop_sms_name(shop_id)
-            first_name = customer_name.split()[0] if customer_name else "there"
-            v_year = current_vehicle.get("year", "")
-            v_make = current_vehicle.get("make", "")
-            v_model = current_vehicle.get("model", "")
-            vehicle_str = " ".join(str(p) for p in [v_year, v_make, v_model] if p)
-
-            if status_update.new_status == "ready":
-                shop_resp = supabase.table("shops").select("google_review_url").eq("shop_id", shop_id).execute()
-                review_url = (shop_resp.data[0].get("google_review_url") or "") if shop_resp.data else ""
-                sms_body = f"Great news {first_name}! Your vehicle is ready for pickup at {shop_name}."
-                if vehicle_str:
-                    sms_body += f" Thank you for trusting us with your {vehicle_str}."
-                if review_url:
-                    sms_body += f" If you have a moment, please leave us a review: {review_url}"
-            else:
-                status_messages = {
-                    "checked_in": f"Hi {first_name}! Your vehicle has been checked in at {shop_name}.",
-                    "inspection": "Update: Your vehicle is now being inspected.",
-                    "waiting_parts": "Update: Your vehicle is awaiting parts. We'll notify you when work resumes.",
-                    "in_progress": "Update: Your vehicle service is now in progress.",
-                    "awaiting_warranty": "Update: Your vehicle is awaiting warranty approval. We'll keep you posted.",
-                    "quality_check": "Update: Your vehicle is undergoing a final quality check.",
-                }
-                sms_body = status_messages.get(
-                    status_update.new_status,
-                    f"Update on your vehicle: {status_update.new_status.replace('_', ' ').title()}",
-                )
-            if status_update.message:
-                sms_body += f"\n{status_update.message}"
-            send_sms(customer_phone, sms_body)
+        if current_vehicle.get("customer_phone"):
+            background_tasks.add_task(
+                _sms_status_update, current_vehicle, status_update.new_status, status_update.message,
+            )
 
         return {"success": True, "message": "Status updated successfully"}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"update_vehicle_status error: {e}")
+        logger.error("update_vehicle_status error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.patch("/vehicles/{vehicle_id}/toggle-warranty")
-async def toggle_warranty_status(vehicle_id: str, user: dict = Depends(get_current_user)):
+async def toggle_warranty_status(
+    vehicle_id: str,
+    background_tasks: BackgroundTasks,
+    user: dict = Depends(get_current_user),
+):
     try:
-        current_vehicle = _verify_vehicle_access(vehicle_id, user)
-        new_warranty_status = not current_vehicle.get("awaiting_warranty", False)
-
-        update_data = {
-            "awaiting_warranty": new_warranty_status,
-            "status": "awaiting_warranty" if new_warranty_status else "in_progress",
-        }
-        supabase.table("vehicles").update(update_data).eq("vehicle_id", vehicle_id).execute()
+        resp = await supabase.rpc("toggle_warranty_status", {
+            "p_vehicle_id": vehicle_id,
+            **_vehicle_rpc_access(user),
+        }).execute()
+        current_vehicle = _check_vehicle_access(resp.data, user)
+        new_warranty_status = current_vehicle["awaiting_warranty"]
 
         customer_phone = current_vehicle.get("customer_phone")
         if customer_phone and new_warranty_status:
-            send_sms(
+            background_tasks.add_task(
+                send_sms,
                 customer_phone,
                 "Update: Your vehicle is awaiting warranty approval. We'll notify you once approved and work can continue.",
             )
 
-        return {"success": True, "awaiting_warranty": new_warranty_status, "new_status": update_data["status"]}
+        return {"success": True, "awaiting_warranty": new_warranty_status, "new_status": current_vehicle["status"]}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"toggle_warranty_status error: {e}")
+        logger.error("toggle_warranty_status error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -578,17 +867,23 @@ async def ai_chat(vehicle_id: str, data: AIChatMessage):
     """Customer sends a message; AI responds. Both saved to messages table."""
     # Get vehicle + shop context
     try:
-        v_resp = supabase.table("vehicles").select("*").eq("vehicle_id", vehicle_id).execute()
-        if not v_resp.data:
+        v_resp = await (
+            supabase.table("vehicles")
+            .select("shop_id,customer_name,year,make,model,status")
+            .eq("vehicle_id", vehicle_id)
+            .maybe_single()
+            .execute()
+        )
+        if not v_resp:
             raise HTTPException(status_code=404, detail="Vehicle not found")
-        v = v_resp.data[0]
-        shop_name = _shop_sms_name(v.get("shop_id", ""))
+        v = v_resp.data
+        shop_name = await _shop_sms_name(v.get("shop_id", ""))
         first_name = (v.get("customer_name") or "valued customer").split()[0]
         vehicle_str = " ".join(str(x) for x in [v.get("year"), v.get("make"), v.get("model")] if x)
         status_label = _STATUS_LABELS.get(v.get("status", ""), v.get("status", ""))
 
         # Fetch conversation history (last 20 exchanges)
-        hist_resp = (
+        hist_resp = await (
             supabase.table("messages")
             .select("sender_type,message_text")
             .eq("vehicle_id", vehicle_id)
@@ -606,7 +901,7 @@ async def ai_chat(vehicle_id: str, data: AIChatMessage):
 
         # Save the customer message first — this ensures it's always persisted
         # even if the Anthropic call fails or the AI message insert fails.
-        supabase.table("messages").insert({
+        await supabase.table("messages").insert({
             "vehicle_id": vehicle_id,
             "sender_type": "customer",
             "message_text": data.message,
@@ -624,7 +919,7 @@ async def ai_chat(vehicle_id: str, data: AIChatMessage):
                 f"say the service advisor can provide that. Keep responses under 3 short sentences unless more detail "
                 f"is clearly needed. Do not make up information."
             )
-            ai_resp = anthropic_client.messages.create(
+            ai_resp = await anthropic_client.messages.create(
                 model="claude-3-haiku-20240307",
                 max_tokens=350,
                 system=system_prompt,
@@ -635,20 +930,20 @@ async def ai_chat(vehicle_id: str, data: AIChatMessage):
         # Save AI response separately so a constraint/type error here doesn't
         # affect the already-saved customer message.
         try:
-            supabase.table("messages").insert({
+            await supabase.table("messages").insert({
                 "vehicle_id": vehicle_id,
                 "sender_type": "ai",
                 "message_text": ai_text,
             }).execute()
         except Exception as ai_save_err:
-            logger.warning(f"ai_chat: failed to save AI message (non-critical): {ai_save_err}")
+            logger.warning("ai_chat: failed to save AI message (non-critical): %s", ai_save_err)
 
         return {"response": ai_text}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"ai_chat error: {e}")
+        logger.error("ai_chat error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -658,12 +953,13 @@ async def ai_chat(vehicle_id: str, data: AIChatMessage):
 async def create_message(
     vehicle_id: str,
     message: MessageCreate,
+    background_tasks: BackgroundTasks,
     credentials: Optional[HTTPAuthorizationCredentials] = Security(bearer_scheme),
 ):
     if message.sender_type == "advisor" and not credentials:
         raise HTTPException(status_code=401, detail="Authentication required for advisor messages")
     try:
-        resp = supabase.table("messages").insert({
+        resp = await supabase.table("messages").insert({
             "vehicle_id": vehicle_id,
             "sender_type": message.sender_type,
             "message_text": message.message_text,
@@ -671,39 +967,31 @@ async def create_message(
 
         # SMS customer when advisor sends a message
         if message.sender_type == "advisor":
-            try:
-                v_resp = supabase.table("vehicles").select("customer_phone,customer_name,shop_id,unique_link").eq("vehicle_id", vehicle_id).execute()
-                if v_resp.data:
-                    v = v_resp.data[0]
-                    if v.get("customer_phone"):
-                        shop_name = _shop_sms_name(v.get("shop_id", ""))
-                        first_name = (v.get("customer_name") or "there").split()[0]
-                        preview = message.message_text[:100] + ("…" if len(message.message_text) > 100 else "")
-                        portal_link = f"{PORTAL_URL}/track/{v['unique_link']}"
-                        send_sms(
-                            v["customer_phone"],
-                            f"Hi {first_name}! New message from {shop_name}: \"{preview}\" View here: {portal_link}"
-                        )
-            except Exception as sms_err:
-                logger.warning(f"Advisor message SMS failed (non-critical): {sms_err}")
+            preview = message.message_text[:100] + ("…" if len(message.message_text) > 100 else "")
+            background_tasks.add_task(
+                _sms_vehicle_customer,
+                vehicle_id,
+                "Hi {first_name}! New message from {shop_name}: \"{preview}\" View here: {portal_link}",
+                preview=preview,
+            )
 
         return resp.data[0]
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"create_message error: {e}")
+        logger.error("create_message error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/vehicles/{vehicle_id}/messages")
 async def get_messages(vehicle_id: str):
     try:
-        resp = supabase.table("messages").select("*").eq("vehicle_id", vehicle_id).order("sent_at").execute()
+        resp = await supabase.table("messages").select("*").eq("vehicle_id", vehicle_id).order("sent_at").execute()
         return resp.data
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"get_messages error: {e}")
+        logger.error("get_messages error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -717,27 +1005,22 @@ async def upload_media(
     user: dict = Depends(get_current_user),
 ):
     try:
-        _verify_vehicle_access(vehicle_id, user)
+        await _verify_vehicle_access(vehicle_id, user)
 
         if file.content_type not in ALLOWED_MIME_TYPES:
             raise HTTPException(status_code=415, detail=f"File type '{file.content_type}' is not allowed.")
 
-        file_content = await file.read(MAX_UPLOAD_BYTES + 1)
-        if len(file_content) > MAX_UPLOAD_BYTES:
+        if file.size is not None and file.size > MAX_UPLOAD_BYTES:
             raise HTTPException(status_code=413, detail="File exceeds the 50 MB upload limit.")
 
-        ext = file.filename.rsplit(".", 1)[-1].lower() if "." in file.filename else "bin"
-        unique_filename = f"{vehicle_id}_{uuid.uuid4()}.{ext}"
+        ext = os.path.splitext(file.filename or "")[1][1:].lower() or "bin"
+        unique_filename = f"{vehicle_id}_{uuid.uuid4().hex}.{ext}"
 
-        supabase.storage.from_("vehicle-photos").upload(
-            unique_filename,
-            file_content,
-            {"content-type": file.content_type or "application/octet-stream"},
-        )
+        await _upload_media_object(unique_filename, file)
 
-        public_url = supabase.storage.from_("vehicle-photos").get_public_url(unique_filename)
+        public_url = f"{MEDIA_PUBLIC_URL}{unique_filename}"
 
-        media_resp = supabase.table("media").insert({
+        media_resp = await supabase.table("media").insert({
             "vehicle_id": vehicle_id,
             "user_id": user["user_id"],
             "media_type": "photo" if (file.content_type or "").startswith("image") else "video",
@@ -750,19 +1033,19 @@ async def upload_media(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"upload_media error: {e}")
+        logger.error("upload_media error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/vehicles/{vehicle_id}/media")
-async def get_media(vehicle_id: str):
+async def get_media(vehicle_id: str, request: Request, response: Response):
     try:
-        resp = supabase.table("media").select("*").eq("vehicle_id", vehicle_id).order("uploaded_at", desc=True).execute()
-        return resp.data
+        resp = await supabase.table("media").select("*").eq("vehicle_id", vehicle_id).order("uploaded_at", desc=True).execute()
+        return _with_etag(request, response, resp.data)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"get_media error: {e}")
+        logger.error("get_media error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -772,11 +1055,12 @@ async def get_media(vehicle_id: str):
 async def create_approval(
     vehicle_id: str,
     approval: ApprovalCreate,
+    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_user),
 ):
     try:
-        _verify_vehicle_access(vehicle_id, user)
-        resp = supabase.table("approvals").insert({
+        await _verify_vehicle_access(vehicle_id, user)
+        resp = await supabase.table("approvals").insert({
             "vehicle_id": vehicle_id,
             "description": approval.description,
             "cost": approval.cost,
@@ -784,54 +1068,45 @@ async def create_approval(
         new_approval = resp.data[0]
 
         # SMS customer with portal link
-        try:
-            v_resp = supabase.table("vehicles").select("customer_phone,customer_name,unique_link,shop_id").eq("vehicle_id", vehicle_id).execute()
-            if v_resp.data:
-                v = v_resp.data[0]
-                if v.get("customer_phone"):
-                    shop_name = _shop_sms_name(v.get("shop_id", ""))
-                    first_name = (v.get("customer_name") or "there").split()[0]
-                    portal_link = f"{PORTAL_URL}/track/{v['unique_link']}"
-                    send_sms(
-                        v["customer_phone"],
-                        f"Hi {first_name}! {shop_name} has sent you a repair approval request. "
-                        f"Please review and respond here: {portal_link}"
-                    )
-        except Exception as sms_err:
-            logger.warning(f"Approval SMS failed (non-critical): {sms_err}")
+        background_tasks.add_task(
+            _sms_vehicle_customer,
+            vehicle_id,
+            "Hi {first_name}! {shop_name} has sent you a repair approval request. "
+            "Please review and respond here: {portal_link}",
+        )
 
         return new_approval
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"create_approval error: {e}")
+        logger.error("create_approval error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.patch("/approvals/{approval_id}")
 async def respond_to_approval(approval_id: str, response_data: ApprovalResponse):
     try:
-        resp = supabase.table("approvals").update({
+        # approved_at is stamped by the approvals_set_approved_at trigger.
+        await supabase.table("approvals").update({
             "approved": response_data.approved,
-            "approved_at": datetime.now().isoformat(),
         }).eq("approval_id", approval_id).execute()
         return {"success": True, "approved": response_data.approved}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"respond_to_approval error: {e}")
+        logger.error("respond_to_approval error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/vehicles/{vehicle_id}/approvals")
 async def get_approvals(vehicle_id: str):
     try:
-        resp = supabase.table("approvals").select("*").eq("vehicle_id", vehicle_id).execute()
+        resp = await supabase.table("approvals").select("*").eq("vehicle_id", vehicle_id).execute()
         return resp.data
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"get_approvals error: {e}")
+        logger.error("get_approvals error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -841,31 +1116,30 @@ async def get_approvals(vehicle_id: str):
 async def get_schedule_page(shop_id: str):
     """Public: shop info + open days + blocked dates for the booking calendar."""
     try:
-        shop_resp = supabase.table("shops").select("*").eq("shop_id", shop_id).execute()
-        if not shop_resp.data:
-            raise HTTPException(status_code=404, detail="Shop not found")
-        shop = shop_resp.data[0]
-
-        hours_resp = supabase.table("shop_hours").select("day_of_week,open_time,close_time,slot_duration_minutes").eq("shop_id", shop_id).execute()
-        open_days = [h["day_of_week"] for h in hours_resp.data]
-
         today = date_type.today()
         future = today + timedelta(days=60)
-        blocked_resp = (
+        # Independent reads: fetch the shop, its hours and blocked dates together.
+        shop, hours_resp, blocked_resp = await asyncio.gather(
+            _get_shop_cached(shop_id),
+            supabase.table("shop_hours").select("day_of_week,open_time,close_time,slot_duration_minutes").eq("shop_id", shop_id).execute(),
             supabase.table("blocked_dates")
             .select("blocked_date")
             .eq("shop_id", shop_id)
             .gte("blocked_date", today.isoformat())
             .lte("blocked_date", future.isoformat())
-            .execute()
+            .execute(),
         )
+        if not shop:
+            raise HTTPException(status_code=404, detail="Shop not found")
+
+        open_days = [h["day_of_week"] for h in hours_resp.data]
         blocked_dates = [b["blocked_date"] for b in blocked_resp.data]
 
         return {"shop": shop, "open_days": open_days, "blocked_dates": blocked_dates}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"get_schedule_page error: {e}")
+        logger.error("get_schedule_page error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -881,31 +1155,38 @@ async def get_available_slots(shop_id: str, date: str):
         if date_obj < date_type.today():
             return {"slots": [], "reason": "past"}
 
-        # Check blocked
-        blocked_resp = supabase.table("blocked_dates").select("block_id").eq("shop_id", shop_id).eq("blocked_date", date).execute()
-        if blocked_resp.data:
-            return {"slots": [], "reason": "closed"}
-
-        # Get shop timezone
-        shop_resp = supabase.table("shops").select("timezone").eq("shop_id", shop_id).execute()
-        tz_str = shop_resp.data[0].get("timezone", "America/Denver") if shop_resp.data else "America/Denver"
-        tz = _get_tz(tz_str)
-
         # day_of_week: 0=Sun (JS convention, same as what we stored)
         # Python weekday(): 0=Mon → convert: (weekday + 1) % 7
         python_dow = date_obj.weekday()
         our_dow = (python_dow + 1) % 7
 
-        hours_resp = supabase.table("shop_hours").select("*").eq("shop_id", shop_id).eq("day_of_week", our_dow).execute()
-        if not hours_resp.data:
+        # Blocked check, shop timezone and that day's hours don't depend on
+        # each other; only the appointment window needs the timezone.
+        blocked_resp, shop, hours_resp = await asyncio.gather(
+            supabase.table("blocked_dates").select("block_id").eq("shop_id", shop_id).eq("blocked_date", date).execute(),
+            _get_shop_cached(shop_id),
+            supabase.table("shop_hours")
+            .select("open_time,close_time,slot_duration_minutes,max_concurrent")
+            .eq("shop_id", shop_id)
+            .eq("day_of_week", our_dow)
+            .maybe_single()
+            .execute(),
+        )
+        if blocked_resp.data:
             return {"slots": [], "reason": "closed"}
-        hours = hours_resp.data[0]
+
+        tz_str = shop.get("timezone", "America/Denver") if shop else "America/Denver"
+        tz = _get_tz(tz_str)
+
+        if not hours_resp:
+            return {"slots": [], "reason": "closed"}
+        hours = hours_resp.data
 
         # Get existing appointments for that day (UTC bounds)
         day_start = datetime(date_obj.year, date_obj.month, date_obj.day, 0, 0, 0, tzinfo=tz).astimezone(ZoneInfo("UTC"))
         day_end = datetime(date_obj.year, date_obj.month, date_obj.day, 23, 59, 59, tzinfo=tz).astimezone(ZoneInfo("UTC"))
 
-        apts_resp = (
+        apts_resp = await (
             supabase.table("appointments")
             .select("scheduled_at,status")
             .eq("shop_id", shop_id)
@@ -934,18 +1215,17 @@ async def get_available_slots(shop_id: str, date: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"get_available_slots error: {e}")
+        logger.error("get_available_slots error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/schedule/{shop_id}/book")
-async def book_appointment(shop_id: str, appointment: AppointmentCreate):
+async def book_appointment(shop_id: str, appointment: AppointmentCreate, background_tasks: BackgroundTasks):
     """Public: create a new appointment booking."""
     try:
-        shop_resp = supabase.table("shops").select("name,timezone").eq("shop_id", shop_id).execute()
-        if not shop_resp.data:
+        shop = await _get_shop_cached(shop_id)
+        if not shop:
             raise HTTPException(status_code=404, detail="Shop not found")
-        shop = shop_resp.data[0]
 
         # Parse and validate the slot time
         try:
@@ -962,7 +1242,7 @@ async def book_appointment(shop_id: str, appointment: AppointmentCreate):
         if scheduled_dt < datetime.now(ZoneInfo("UTC")):
             raise HTTPException(status_code=400, detail="Cannot book appointments in the past.")
 
-        resp = supabase.table("appointments").insert({
+        resp = await supabase.table("appointments").insert({
             "shop_id": shop_id,
             "customer_name": appointment.customer_name,
             "customer_phone": appointment.customer_phone,
@@ -983,19 +1263,20 @@ async def book_appointment(shop_id: str, appointment: AppointmentCreate):
         date_str = local_dt.strftime("%A, %B %-d") if os.name != "nt" else local_dt.strftime("%A, %B %d").replace(" 0", " ")
         time_str = local_dt.strftime("%-I:%M %p") if os.name != "nt" else local_dt.strftime("%I:%M %p").lstrip("0")
 
-        send_sms(
+        background_tasks.add_task(
+            send_sms,
             appointment.customer_phone,
             f"Hi {appointment.customer_name}! Your appointment at {shop['name']} is confirmed for "
             f"{date_str} at {time_str}. We'll see you then!",
         )
 
-        logger.info(f"Appointment booked: {appointment.customer_name} at {scheduled_dt.isoformat()}")
+        logger.info("Appointment booked: %s at %s", appointment.customer_name, scheduled_dt.isoformat())
         return resp.data[0]
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"book_appointment error: {e}")
+        logger.error("book_appointment error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1005,15 +1286,15 @@ async def book_appointment(shop_id: str, appointment: AppointmentCreate):
 async def create_advisor_appointment(
     shop_id: str,
     data: AdvisorAppointmentCreate,
+    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_user),
 ):
     if user["role"] != "admin" and user.get("shop_id") != shop_id:
         raise HTTPException(status_code=403, detail="Access denied")
     try:
-        shop_resp = supabase.table("shops").select("name,timezone,phone").eq("shop_id", shop_id).execute()
-        if not shop_resp.data:
+        shop = await _get_shop_cached(shop_id)
+        if not shop:
             raise HTTPException(status_code=404, detail="Shop not found")
-        shop = shop_resp.data[0]
         tz = _get_tz(shop.get("timezone", "America/Denver"))
 
         try:
@@ -1024,23 +1305,24 @@ async def create_advisor_appointment(
             raise HTTPException(status_code=400, detail="Invalid scheduled_at format. Use YYYY-MM-DDTHH:MM.")
 
         # Upsert customer
-        cust_resp = (
+        cust_resp = await (
             supabase.table("customers")
             .select("id")
             .eq("shop_id", shop_id)
             .eq("phone", data.customer_phone)
+            .limit(1)
             .execute()
         )
         if cust_resp.data:
             customer_id = cust_resp.data[0]["id"]
-            supabase.table("customers").update({
+            # updated_at is stamped by the customers_set_updated_at trigger.
+            await supabase.table("customers").update({
                 "first_name": data.first_name,
                 "last_name": data.last_name,
                 "email": data.customer_email,
-                "updated_at": datetime.now(ZoneInfo("UTC")).isoformat(),
             }).eq("id", customer_id).execute()
         else:
-            ins = supabase.table("customers").insert({
+            ins = await supabase.table("customers").insert({
                 "shop_id": shop_id,
                 "first_name": data.first_name,
                 "last_name": data.last_name,
@@ -1049,7 +1331,7 @@ async def create_advisor_appointment(
             }).execute()
             customer_id = ins.data[0]["id"]
 
-        apt_resp = supabase.table("appointments").insert({
+        apt_resp = await supabase.table("appointments").insert({
             "shop_id": shop_id,
             "customer_id": customer_id,
             "customer_name": f"{data.first_name} {data.last_name}",
@@ -1082,15 +1364,15 @@ async def create_advisor_appointment(
             f"{formatted_time}. Thanks for trusting us with your {vehicle_str}. "
             f"Have a nice day! Reply STOP to opt out."
         )
-        send_sms(data.customer_phone, sms_body)
+        background_tasks.add_task(send_sms, data.customer_phone, sms_body)
 
-        logger.info(f"Advisor appointment created: {data.first_name} {data.last_name} at {scheduled_dt.isoformat()}")
+        logger.info("Advisor appointment created: %s %s at %s", data.first_name, data.last_name, scheduled_dt.isoformat())
         return {"appointment": apt, "customer_id": customer_id}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"create_advisor_appointment error: {e}")
+        logger.error("create_advisor_appointment error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1111,8 +1393,14 @@ async def search_customers(
 
         is_phone_like = all(c in "0123456789-+(). " for c in q)
 
+        def _add(rows):
+            for c in rows or []:
+                if c["id"] not in seen:
+                    seen.add(c["id"])
+                    results.append(c)
+
         if is_phone_like:
-            resp = (
+            resp = await (
                 supabase.table("customers")
                 .select("*")
                 .eq("shop_id", shop_id)
@@ -1120,63 +1408,61 @@ async def search_customers(
                 .limit(8)
                 .execute()
             )
-            for c in (resp.data or []):
-                if c["id"] not in seen:
-                    seen.add(c["id"])
-                    results.append(c)
+            _add(resp.data)
         else:
-            for col in ("first_name", "last_name"):
-                resp = (
-                    supabase.table("customers")
-                    .select("*")
-                    .eq("shop_id", shop_id)
-                    .ilike(col, f"%{q}%")
-                    .limit(6)
-                    .execute()
-                )
-                for c in (resp.data or []):
-                    if c["id"] not in seen:
-                        seen.add(c["id"])
-                        results.append(c)
+            name_resps = await asyncio.gather(*(
+                supabase.table("customers")
+                .select("*")
+                .eq("shop_id", shop_id)
+                .ilike(col, f"%{q}%")
+                .limit(6)
+                .execute()
+                for col in ("first_name", "last_name")
+            ))
+            for resp in name_resps:
+                _add(resp.data)
 
         # VIN search — find customer_ids from appointments
         if len(q) >= 4:
-            vin_resp = (
+            vin_resp = await (
                 supabase.table("appointments")
-                .select("customer_id,vehicle_year,vehicle_make,vehicle_model,vehicle_vin")
+                .select("customer_id")
                 .eq("shop_id", shop_id)
                 .ilike("vehicle_vin", f"%{q.upper()}%")
                 .limit(5)
                 .execute()
             )
-            vin_customer_ids = [r["customer_id"] for r in (vin_resp.data or []) if r.get("customer_id") and r["customer_id"] not in seen]
+            vin_customer_ids = list(dict.fromkeys(
+                r["customer_id"] for r in (vin_resp.data or [])
+                if r.get("customer_id") and r["customer_id"] not in seen
+            ))
             if vin_customer_ids:
-                for cid in vin_customer_ids:
-                    cr = supabase.table("customers").select("*").eq("id", cid).execute()
-                    for c in (cr.data or []):
-                        if c["id"] not in seen:
-                            seen.add(c["id"])
-                            results.append(c)
-
-        # Attach most recent vehicle to each customer
-        for customer in results:
-            apt_resp = (
-                supabase.table("appointments")
-                .select("vehicle_year,vehicle_make,vehicle_model,vehicle_vin")
-                .eq("customer_id", customer["id"])
-                .not_.is_("vehicle_make", "null")
-                .order("scheduled_at", desc=True)
-                .limit(1)
-                .execute()
-            )
+                cr = await supabase.table("customers").select("*").in_("id", vin_customer_ids).execute()
+                by_id = {c["id"]: c for c in (cr.data or [])}
+                _add(by_id[cid] for cid in vin_customer_ids if cid in by_id)
+
+        results = results[:8]
+
+        # Attach most recent vehicle to each customer, one lookup per customer in parallel
+        apt_resps = await asyncio.gather(*(
+            supabase.table("appointments")
+            .select("vehicle_year,vehicle_make,vehicle_model,vehicle_vin")
+            .eq("customer_id", customer["id"])
+            .not_.is_("vehicle_make", "null")
+            .order("scheduled_at", desc=True)
+            .limit(1)
+            .execute()
+            for customer in results
+        ))
+        for customer, apt_resp in zip(results, apt_resps):
             customer["last_vehicle"] = apt_resp.data[0] if apt_resp.data else None
 
-        return {"customers": results[:8]}
+        return {"customers": results}
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"search_customers error: {e}")
+        logger.error("search_customers error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1185,7 +1471,7 @@ async def get_shop_appointments(shop_id: str, user: dict = Depends(get_current_u
     if user["role"] != "admin" and user.get("shop_id") != shop_id:
         raise HTTPException(status_code=403, detail="Access denied")
     try:
-        resp = (
+        resp = await (
             supabase.table("appointments")
             .select("*")
             .eq("shop_id", shop_id)
@@ -1196,7 +1482,7 @@ async def get_shop_appointments(shop_id: str, user: dict = Depends(get_current_u
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"get_shop_appointments error: {e}")
+        logger.error("get_shop_appointments error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1207,19 +1493,19 @@ async def update_appointment_status(
     user: dict = Depends(get_current_user),
 ):
     try:
-        apt_resp = supabase.table("appointments").select("*").eq("appointment_id", appointment_id).execute()
+        apt_resp = await supabase.table("appointments").select("shop_id").eq("appointment_id", appointment_id).execute()
         if not apt_resp.data:
             raise HTTPException(status_code=404, detail="Appointment not found")
         apt = apt_resp.data[0]
         if user["role"] != "admin" and apt.get("shop_id") != user.get("shop_id"):
             raise HTTPException(status_code=403, detail="Access denied")
 
-        supabase.table("appointments").update({"status": update.status}).eq("appointment_id", appointment_id).execute()
+        await supabase.table("appointments").update({"status": update.status}).eq("appointment_id", appointment_id).execute()
         return {"success": True, "status": update.status}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"update_appointment_status error: {e}")
+        logger.error("update_appointment_status error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1228,12 +1514,12 @@ async def update_appointment_status(
 @app.get("/shop/{shop_id}/hours")
 async def get_shop_hours(shop_id: str):
     try:
-        resp = supabase.table("shop_hours").select("*").eq("shop_id", shop_id).order("day_of_week").execute()
+        resp = await supabase.table("shop_hours").select("*").eq("shop_id", shop_id).order("day_of_week").execute()
         return resp.data
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"get_shop_hours error: {e}")
+        logger.error("get_shop_hours error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1246,7 +1532,7 @@ async def upsert_shop_hours(
     if user["role"] != "admin" and user.get("shop_id") != shop_id:
         raise HTTPException(status_code=403, detail="Access denied")
     try:
-        supabase.table("shop_hours").upsert({
+        await supabase.table("shop_hours").upsert({
             "shop_id": shop_id,
             "day_of_week": entry.day_of_week,
             "open_time": entry.open_time,
@@ -1258,7 +1544,7 @@ async def upsert_shop_hours(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"upsert_shop_hours error: {e}")
+        logger.error("upsert_shop_hours error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1267,12 +1553,12 @@ async def delete_shop_hours(shop_id: str, day_of_week: int, user: dict = Depends
     if user["role"] != "admin" and user.get("shop_id") != shop_id:
         raise HTTPException(status_code=403, detail="Access denied")
     try:
-        supabase.table("shop_hours").delete().eq("shop_id", shop_id).eq("day_of_week", day_of_week).execute()
+        await supabase.table("shop_hours").delete().eq("shop_id", shop_id).eq("day_of_week", day_of_week).execute()
         return {"success": True}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"delete_shop_hours error: {e}")
+        logger.error("delete_shop_hours error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1283,7 +1569,7 @@ async def add_blocked_date(shop_id: str, block: BlockDateCreate, user: dict = De
     if user["role"] != "admin" and user.get("shop_id") != shop_id:
         raise HTTPException(status_code=403, detail="Access denied")
     try:
-        resp = supabase.table("blocked_dates").upsert({
+        resp = await supabase.table("blocked_dates").upsert({
             "shop_id": shop_id,
             "blocked_date": block.blocked_date,
             "reason": block.reason,
@@ -1292,7 +1578,7 @@ async def add_blocked_date(shop_id: str, block: BlockDateCreate, user: dict = De
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"add_blocked_date error: {e}")
+        logger.error("add_blocked_date error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1301,12 +1587,12 @@ async def remove_blocked_date(shop_id: str, blocked_date: str, user: dict = Depe
     if user["role"] != "admin" and user.get("shop_id") != shop_id:
         raise HTTPException(status_code=403, detail="Access denied")
     try:
-        supabase.table("blocked_dates").delete().eq("shop_id", shop_id).eq("blocked_date", blocked_date).execute()
+        await supabase.table("blocked_dates").delete().eq("shop_id", shop_id).eq("blocked_date", blocked_date).execute()
         return {"success": True}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"remove_blocked_date error: {e}")
+        logger.error("remove_blocked_date error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1314,4 +1600,6 @@ async def remove_blocked_date(shop_id: str, blocked_date: str, user: dict = Depe
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Each worker is its own process with its own pools, caches and SMS pacer.
+    # uvloop/httptools are picked up automatically where installed.
+    uvicorn.run("main:app", host="0.0.0.0", port=PORT, workers=WEB_CONCURRENCY)
@@ -2,6 +2,14 @@ from pydantic import BaseModel, field_validator
 from typing import Optional, Literal
 from datetime import datetime
 
+__all__ = [
+    "VALID_STATUSES", "VALID_SENDER_TYPES", "ALLOWED_MIME_TYPES", "MAX_UPLOAD_BYTES",
+    "VehicleCreate", "StatusUpdate", "MessageCreate", "ApprovalCreate", "ApprovalResponse",
+    "VehicleResponse", "StatusResponse", "AppointmentCreate", "AppointmentStatusUpdate",
+    "ShopHourEntry", "BlockDateCreate", "ShopCreate", "UserInvite", "UserUpdate",
+    "AIChatMessage", "AdvisorAppointmentCreate",
+]
+
 VALID_STATUSES = {
     "checked_in", "inspection", "waiting_parts", "in_progress",
     "awaiting_warranty", "quality_check", "ready", "completed"
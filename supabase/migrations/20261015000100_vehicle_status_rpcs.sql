@@ -0,0 +1,64 @@
+-- Status changes in one round-trip: lock the vehicle, apply the change, log
+-- it to `updates`, and hand back the row as it was before the change.
+--
+-- Writes only happen when the caller may access the vehicle (admin, or same
+-- shop). The row is returned either way so the API can tell 404 from 403.
+
+create or replace function update_status_with_log(
+    p_vehicle_id uuid,
+    p_new_status text,
+    p_user_id uuid,
+    p_message text,
+    p_shop_id uuid,
+    p_is_admin boolean
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v vehicles%rowtype;
+begin
+    select * into v from vehicles where vehicle_id = p_vehicle_id for update;
+    if not found then
+        return null;
+    end if;
+
+    if p_is_admin or v.shop_id is not distinct from p_shop_id then
+        update vehicles set status = p_new_status where vehicle_id = p_vehicle_id;
+        insert into updates (vehicle_id, user_id, old_status, new_status, message)
+        values (p_vehicle_id, p_user_id, v.status, p_new_status, p_message);
+    end if;
+
+    return to_jsonb(v);
+end;
+$$;
+
+
+-- Flip awaiting_warranty (and the matching status) in one statement and
+-- return the updated row.
+
+create or replace function toggle_warranty_status(
+    p_vehicle_id uuid,
+    p_shop_id uuid,
+    p_is_admin boolean
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v vehicles%rowtype;
+begin
+    select * into v from vehicles where vehicle_id = p_vehicle_id for update;
+    if not found then
+        return null;
+    end if;
+
+    if p_is_admin or v.shop_id is not distinct from p_shop_id then
+        update vehicles
+        set awaiting_warranty = not coalesce(awaiting_warranty, false),
+            status = case when coalesce(awaiting_warranty, false) then 'in_progress' else 'awaiting_warranty' end
+        where vehicle_id = p_vehicle_id
+        returning * into v;
+    end if;
+
+    return to_jsonb(v);
+end;
+$$;
@@ -0,0 +1,7 @@
+-- Vehicle lookups by tracking link and by id fetch a single object
+-- (maybe_single). Back the link with a unique index so that lookup is an
+-- index probe and a duplicate link can never make it ambiguous.
+--
+-- Not CONCURRENTLY: migrations run inside a transaction.
+
+create unique index if not exists vehicles_unique_link_key on vehicles (unique_link);
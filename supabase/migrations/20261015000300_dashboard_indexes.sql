@@ -0,0 +1,7 @@
+-- Indexes behind the advisor dashboard summary: open vehicles for a shop,
+-- then customer-message counts, approvals and vehicle photos for that set.
+
+create index if not exists vehicles_shop_id_status_idx on vehicles (shop_id, status);
+create index if not exists messages_vehicle_id_sender_type_idx on messages (vehicle_id, sender_type);
+create index if not exists approvals_vehicle_id_idx on approvals (vehicle_id);
+create index if not exists media_vehicle_id_caption_idx on media (vehicle_id, caption);
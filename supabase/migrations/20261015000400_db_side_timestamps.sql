@@ -0,0 +1,32 @@
+-- Stamp response/edit times with the database clock instead of sending
+-- timestamps from the API, whose workers may disagree (and previously sent
+-- naive local time for approvals).
+
+create or replace function set_approved_at() returns trigger
+language plpgsql
+as $$
+begin
+    new.approved_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists approvals_set_approved_at on approvals;
+create trigger approvals_set_approved_at
+    before update of approved on approvals
+    for each row execute function set_approved_at();
+
+
+create or replace function set_updated_at() returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists customers_set_updated_at on customers;
+create trigger customers_set_updated_at
+    before update on customers
+    for each row execute function set_updated_at();
@@ -0,0 +1,17 @@
+-- Indexes matching the remaining per-request filters and sort orders.
+-- vehicles (unique_link) and vehicles (shop_id, status) already exist and
+-- also serve plain shop_id lookups.
+
+-- Portal/advisor message thread and media gallery: filter by vehicle,
+-- read in display order.
+create index if not exists messages_vehicle_id_sent_at_idx on messages (vehicle_id, sent_at);
+create index if not exists media_vehicle_id_uploaded_at_idx on media (vehicle_id, uploaded_at desc);
+
+-- Day slots and the shop calendar: one shop, a range/order on scheduled_at.
+create index if not exists appointments_shop_id_scheduled_at_idx on appointments (shop_id, scheduled_at);
+
+-- "Last vehicle" per customer in customer search.
+create index if not exists appointments_customer_id_scheduled_at_idx on appointments (customer_id, scheduled_at desc);
+
+-- Customer match by phone when an advisor books an appointment.
+create index if not exists customers_shop_id_phone_idx on customers (shop_id, phone);